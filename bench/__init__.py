@@ -0,0 +1,125 @@
+"""Benchmark suite: synthetic data, a fixed-concurrency runner and baseline comparison.
+
+    python -m bench generate --database-url sqlite:///bench.db --users 100000 --records 1000000
+    python -m bench run --serve sqlite:///bench.db --concurrency 8 --output baseline.json
+    python -m bench run --url http://127.0.0.1:80 --output current.json   # docker-compose stack
+    python -m bench compare baseline.json current.json --metric p95_ms --tolerance 0.2
+    python -m bench lookups --database-url sqlite:///bench.db --calls 5000
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+# The per-client rate limits and the in-flight cap would answer most of a run with 429/503, since every
+# request comes from the one benchmark client; --env can still turn them back on.
+SERVE_ENV = {"RATE_LIMIT_WRITE": "0", "RATE_LIMIT_LIST": "0", "RATE_LIMIT_READ": "0", "MAX_IN_FLIGHT": "0"}
+
+
+@contextmanager
+def serve(database_url: str, port: int, env: dict):
+    # uvicorn in a child process against database_url, for runs without the docker-compose stack
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                               cwd=ROOT, env={**os.environ, **SERVE_ENV, **env, "DATABASE_URL": database_url})
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health/pool", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError("server did not come up")
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv: list[str]):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate_parser = commands.add_parser("generate", help="recreate the schema and fill it with synthetic data")
+    generate_parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///bench.db"))
+    generate_parser.add_argument("--users", type=int, default=100_000)
+    generate_parser.add_argument("--records", type=int, default=1_000_000)
+    generate_parser.add_argument("--countries", type=int, default=50)
+    generate_parser.add_argument("--diseases", type=int, default=200)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    run_parser = commands.add_parser("run", help="drive every route and write a JSON report")
+    target = run_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--serve", metavar="DATABASE_URL", help="start uvicorn against this database for the run")
+    run_parser.add_argument("--port", type=int, default=8765)
+    run_parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                            help="extra environment for --serve, e.g. PAGE_CACHE_TTL=0")
+    run_parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--warmup", type=int, default=10)
+    run_parser.add_argument("--only", action="append", help="run just this scenario (repeatable)")
+    run_parser.add_argument("--output", default="bench-report.json")
+    compare_parser = commands.add_parser("compare", help="exit 1 when a report regressed against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--metric", default="p95_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+    compare_parser.add_argument("--tolerance", type=float, default=0.2)
+    lookups_parser = commands.add_parser("lookups", help="per-call cost of the CRUDService single-key lookups")
+    lookups_parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///bench.db"))
+    lookups_parser.add_argument("--calls", type=int, default=5000, help="measured calls per lookup and variant")
+    lookups_parser.add_argument("--seed", type=int, default=0)
+    lookups_parser.add_argument("--output", help="also write the results here as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        os.environ["DATABASE_URL"] = args.database_url
+        sys.path.insert(0, str(ROOT))
+        import main as app_module
+        import migrations
+        from bench.generate import generate
+
+        print(generate(app_module.sqlalchemy_engine, app_module.Base.metadata, users=args.users, records=args.records,
+                       countries=args.countries, diseases=args.diseases, seed=args.seed))
+        with app_module.sessionLocal() as db:
+            app_module.rebuild_case_counters(db)
+            db.commit()
+        # create_all built the schema of the latest revision
+        with app_module.sqlalchemy_engine.begin() as conn:
+            migrations.ensure_version_table(conn)
+            migrations.set_version(conn, migrations.load_revisions()[-1].revision)
+    elif args.command == "run":
+        from bench.runner import run
+
+        env = dict(item.split("=", 1) for item in args.env)
+        if args.serve:
+            with serve(args.serve, args.port, env) as base_url:
+                report = run(base_url, args.requests, args.concurrency, args.warmup, args.only)
+        else:
+            report = run(args.url, args.requests, args.concurrency, args.warmup, args.only)
+        report["meta"]["env"] = env
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"report written to {args.output}")
+    elif args.command == "lookups":
+        os.environ["DATABASE_URL"] = args.database_url
+        sys.path.insert(0, str(ROOT))
+        import main as app_module
+        from bench.lookups import print_table, run as run_lookups
+
+        results = run_lookups(app_module, args.calls, args.seed)
+        print_table(results)
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        from bench.runner import compare
+
+        regressions = compare(json.loads(Path(args.baseline).read_text()), json.loads(Path(args.current).read_text()),
+                              args.metric, args.tolerance)
+        for regression in regressions:
+            print(regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,86 @@
+"""Synthetic data at configurable scale for the AssignmentSQL.sql schema."""
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+COUNTRIES = ["the USA", "England", "China", "Taiwan", "India", "Chile", "Spain", "United Kingdom",
+             "United Arab Emirates", "Russia"]
+DISEASE_TYPES = ["Acute Flaccid Myelitis (AFM)", "genetic diseases", "Alzheimer's Diseases", "respiratory illness",
+                 "Chancroid", "virology", "infectious diseases", "Clostridium Difficile", "Creutzfeldt-Jakob Disease",
+                 "physiological diseases"]
+PATHOGENS = ["bacteria", "virus", "fungus", "parasite", "prion"]
+DEPARTMENTS = [f"dep{i}" for i in range(1, 21)]
+DEGREES = ["MD", "PhD", "MBBS", "DO"]
+CHUNK_SIZE = 5000
+
+
+def insert_chunks(conn, table, rows):
+    # executemany of one INSERT per chunk; PyMySQL rewrites it into a multi-row VALUES list
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            conn.execute(insert(table), chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(table), chunk)
+
+
+def generate(engine, metadata, users: int = 100_000, records: int = 1_000_000, countries: int = 50,
+             diseases: int = 200, servant_share: float = 0.5, doctor_share: float = 0.3, seed: int = 0) -> dict:
+    """Drops and recreates every table, then fills them; the same arguments always give the same data."""
+    rng = random.Random(seed)
+    tables = metadata.tables
+    country_names = (COUNTRIES + [f"Country {i:03d}" for i in range(countries)])[:countries]
+    disease_codes = ["covid-19"] + [f"D{i:04d}" for i in range(1, diseases)]
+    emails = [f"user{i:07d}@bench.example" for i in range(users)]
+    servants = emails[:int(users * servant_share)]
+    doctors = emails[len(emails) - int(users * doctor_share):]
+    pairs = len(country_names) * len(disease_codes)
+    if records > len(servants) * pairs:
+        raise ValueError(f"{records} records do not fit in {len(servants)} servants x {pairs} (country, disease) pairs")
+
+    started = time.perf_counter()
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        insert_chunks(conn, tables["diseasetype"],
+                      ({"id": i, "description": text} for i, text in enumerate(DISEASE_TYPES, start=1)))
+        insert_chunks(conn, tables["country"],
+                      ({"cname": cname, "population": rng.randint(10_000, 1_500_000_000)} for cname in country_names))
+        insert_chunks(conn, tables["disease"],
+                      ({"disease_code": code, "pathogen": rng.choice(PATHOGENS), "description": f"Disease {code}",
+                        "id": rng.randint(1, len(DISEASE_TYPES))} for code in disease_codes))
+        insert_chunks(conn, tables["discover"],
+                      ({"cname": rng.choice(country_names), "disease_code": code,
+                        "first_enc_date": date(1850, 1, 1) + timedelta(days=rng.randint(0, 62_000))}
+                       for code in disease_codes))
+        insert_chunks(conn, tables["users"],
+                      ({"email": email, "name": f"Name{i}", "surname": f"Surname{i}",
+                        "salary": rng.randint(5_000, 1_500_000), "phone": f"8707{rng.randint(0, 9_999_999):07d}",
+                        "cname": rng.choice(country_names)} for i, email in enumerate(emails)))
+        insert_chunks(conn, tables["publicservant"],
+                      ({"email": email, "department": rng.choice(DEPARTMENTS)} for email in servants))
+        insert_chunks(conn, tables["doctor"], ({"email": email, "degree": rng.choice(DEGREES)} for email in doctors))
+        insert_chunks(conn, tables["specialize"],
+                      ({"id": type_id, "email": email} for email in doctors
+                       for type_id in rng.sample(range(1, len(DISEASE_TYPES) + 1), rng.randint(1, 4))))
+        insert_chunks(conn, tables["record"], record_rows(rng, servants, country_names, disease_codes, records))
+    return {"users": users, "public_servants": len(servants), "doctors": len(doctors), "records": records,
+            "countries": len(country_names), "diseases": len(disease_codes),
+            "seconds": round(time.perf_counter() - started, 1)}
+
+
+def record_rows(rng: random.Random, servants: list[str], country_names: list[str], disease_codes: list[str],
+                records: int):
+    # spread records evenly over the servants, each with distinct (country, disease) pairs
+    pairs = len(country_names) * len(disease_codes)
+    for i, email in enumerate(servants):
+        count = records // len(servants) + (1 if i < records % len(servants) else 0)
+        for pair in rng.sample(range(pairs), count):
+            patients = rng.choice((rng.randint(0, 99_999), rng.randint(100_000, 999_999), rng.randint(0, 5_000_000)))
+            yield {"email": email, "cname": country_names[pair // len(disease_codes)],
+                   "disease_code": disease_codes[pair % len(disease_codes)],
+                   "total_patients": patients, "total_deaths": rng.randint(0, patients // 10)}
@@ -0,0 +1,80 @@
+"""Per-call cost of the CRUDService single-key lookups, in process, against a generated database.
+
+Each lookup runs three ways over the same keys: as an ORM Query built per call (how the lookups used
+to be written), through CRUDService (prebuilt statements), and as the bare DB-API cursor call with the
+already compiled SQL, which is the floor: driver and database time with no SQLAlchemy on top.
+"""
+import random
+import time
+
+from sqlalchemy import select
+
+
+def legacy_lookups(app):
+    Users, PublicServant, Record = app.Users, app.PublicServant, app.Record
+    return {
+        "get_user": lambda key, db: db.query(Users).filter(Users.email == key).first(),
+        "get_publicservant": lambda key, db: db.query(PublicServant).filter(PublicServant.email == key).first(),
+        "get_record_email": lambda key, db: db.query(Record).filter(Record.email == key).all(),
+        "get_record_diseasecode": lambda key, db: db.query(Record).filter(Record.disease_code == key).all(),
+    }
+
+
+def driver_lookup(db, statement, name: str):
+    # the statement compiled once, then only cursor.execute + fetchall per call
+    compiled = statement.compile(dialect=db.get_bind().dialect)
+    sql = str(compiled)
+    cursor = db.connection().connection.cursor()
+
+    def lookup(key, db):
+        params = compiled.construct_params({name: key})
+        cursor.execute(sql, [params[p] for p in compiled.positiontup] if compiled.positional else params)
+        return cursor.fetchall()
+    return lookup
+
+
+def timed(lookup, keys: list, db) -> float:
+    # mean seconds per call; the identity map is cleared between calls, as a fresh request session would be
+    total = 0.0
+    for key in keys:
+        start = time.perf_counter()
+        lookup(key, db)
+        total += time.perf_counter() - start
+        db.expunge_all()
+    return total / len(keys)
+
+
+def run(app, calls: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    legacy = legacy_lookups(app)
+    cases = [
+        ("get_user", app.USER_BY_EMAIL, "email", select(app.Users.email)),
+        ("get_publicservant", app.PUBLICSERVANT_BY_EMAIL, "email", select(app.PublicServant.email)),
+        ("get_record_email", app.RECORDS_BY_EMAIL, "email", select(app.Record.email).distinct()),
+        ("get_record_diseasecode", app.RECORDS_BY_DISEASE, "disease_code", select(app.Disease.disease_code)),
+    ]
+    results = []
+    with app.sessionLocal() as db:
+        for method, statement, name, key_query in cases:
+            population = db.execute(key_query.limit(10_000)).scalars().all()
+            if not population:
+                continue
+            keys = [rng.choice(population) for _ in range(calls)]
+            crud_method = getattr(app.crud, method)
+            variants = {"query": legacy[method], "prebuilt": lambda key, db: crud_method(key, db),
+                        "driver": driver_lookup(db, statement, name)}
+            for lookup in variants.values():
+                timed(lookup, keys[:min(100, calls)], db)  # warm the compiled cache and the page cache
+            seconds = {variant: timed(lookup, keys, db) for variant, lookup in variants.items()}
+            results.append({"lookup": method, **{f"{variant}_us": round(value * 1e6, 1) for variant, value in seconds.items()},
+                            "query_overhead_us": round((seconds["query"] - seconds["driver"]) * 1e6, 1),
+                            "prebuilt_overhead_us": round((seconds["prebuilt"] - seconds["driver"]) * 1e6, 1)})
+    return results
+
+
+def print_table(results: list[dict]):
+    columns = ["lookup", "query_us", "prebuilt_us", "driver_us", "query_overhead_us", "prebuilt_overhead_us"]
+    widths = [max(len(column), *(len(str(row[column])) for row in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
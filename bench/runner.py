@@ -0,0 +1,183 @@
+"""Drives the routes of a running server at fixed concurrency and summarises the latencies."""
+import http.client
+import json
+import math
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+_local = threading.local()
+
+
+def connection(base_url: str) -> http.client.HTTPConnection:
+    # one keep-alive connection per worker thread
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        parts = urlsplit(base_url)
+        conn = _local.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    return conn
+
+
+def request(base_url: str, method: str, path: str, form: dict | None = None) -> int:
+    body = urlencode(form) if form is not None else None
+    headers = {"Content-Type": "application/x-www-form-urlencoded"} if form is not None else {}
+    for attempt in range(2):
+        conn = connection(base_url)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, ConnectionError):
+            conn.close()
+            _local.conn = None
+            if attempt:
+                raise
+
+
+def get_json(base_url: str, path: str):
+    conn = http.client.HTTPConnection(urlsplit(base_url).hostname, urlsplit(base_url).port or 80, timeout=60)
+    conn.request("GET", path)
+    return json.loads(conn.getresponse().read())
+
+
+def scenarios(base_url: str) -> list[dict]:
+    # Parameters come from the data behind the server, so the same list works at any scale.
+    users = get_json(base_url, "/api/v1/users?limit=50")["items"]
+    records = get_json(base_url, "/api/v1/records?limit=50")["items"]
+    email, record = users[len(users) // 2]["email"], records[len(records) // 2]
+    cname, code = record["cname"], record["disease_code"]
+    new_emails = [f"bench-{uuid.uuid4().hex[:12]}@bench.example" for _ in range(100_000)]
+    new_user = iter(new_emails)
+    deleted_user = iter(new_emails)
+
+    def get(name, path):
+        return {"name": name, "method": "GET", "path": lambda: path}
+
+    return [
+        get("index", "/"),
+        get("users page", "/users"),
+        get("users page by country", f"/users?{urlencode({'cname': users[0]['cname']})}"),
+        get("records page", "/records"),
+        get("records page by country and disease", f"/records?{urlencode({'cname': cname, 'disease_code': code})}"),
+        get("publicservants page", "/publicservants"),
+        get("diseases page", "/diseases"),
+        get("users api", "/api/users"),
+        get("records api", f"/api/records?{urlencode({'cname': cname})}"),
+        get("publicservants api", "/api/publicservants"),
+        get("v1 users", "/api/v1/users?limit=500"),
+        get("v1 records", f"/api/v1/records?{urlencode({'cname': cname, 'limit': 500})}"),
+        get("v1 diseases", "/api/v1/diseases"),
+        get("user by email", f"/user/get_by_email?{urlencode({'email': email})}"),
+        get("records by email", f"/record/{record['email']}"),
+        get("publicservant by email", f"/publicservant/{record['email']}"),
+        get("records export", f"/records/export?{urlencode({'format': 'ndjson', 'cname': cname, 'disease_code': code})}"),
+        get("counters", f"/counters?{urlencode({'cname': cname, 'disease_code': code})}"),
+        get("analytics query 1", "/analytics/bacterial-diseases-before-1990"),
+        get("analytics query 2", "/analytics/doctors-not-infectious"),
+        get("analytics query 3", "/analytics/doctors-multi-specialty"),
+        get("analytics query 4", "/analytics/virology-salary-by-country"),
+        get("analytics query 5", "/analytics/covid-departments"),
+        get("analytics query 9", "/analytics/mid-range-reporters"),
+        get("analytics query 10", "/analytics/top-countries"),
+        get("analytics query 11", "/analytics/treated-by-disease"),
+        get("metrics", "/metrics"),
+        {"name": "create user", "method": "POST", "path": lambda: "/user/post",
+         "form": lambda: {"email": next(new_user), "name": "Bench", "surname": "Mark", "salary": 1000,
+                          "phone": "87070000000", "country": cname}},
+        # deletes the users created by the previous scenario, in the same order
+        {"name": "delete user", "method": "GET", "path": lambda: f"/user/delete/{next(deleted_user)}"},
+    ]
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    # nearest rank on sorted latencies
+    return latencies[max(0, math.ceil(q * len(latencies)) - 1)]
+
+
+def run_scenario(base_url: str, scenario: dict, requests: int, concurrency: int, warmup: int) -> dict:
+    lock = threading.Lock()
+
+    def one(_):
+        with lock:
+            path = scenario["path"]()
+            form = scenario["form"]() if "form" in scenario else None
+        start = time.perf_counter()
+        try:
+            code = request(base_url, scenario["method"], path, form)
+        except OSError as e:
+            code = type(e).__name__
+        return time.perf_counter() - start, code
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(warmup)))
+        start = time.perf_counter()
+        results = list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    statuses = Counter(str(code) for _, code in results)
+    # 429s are the server's rate limits at work, not failures of the route
+    throttled = statuses.get("429", 0)
+    errors = sum(count for code, count in statuses.items() if not (code.isdigit() and int(code) < 400)) - throttled
+    return {
+        "method": scenario["method"],
+        "requests": requests,
+        "errors": errors,
+        "throttled": throttled,
+        "status": dict(sorted(statuses.items())),
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 2),
+        "p50_ms": round(1000 * percentile(latencies, 0.50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 0.95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 2),
+        "max_ms": round(1000 * latencies[-1], 2),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(base_url: str, requests: int = 200, concurrency: int = 8, warmup: int = 10,
+        only: list[str] | None = None) -> dict:
+    report = {
+        "meta": {"started_at": datetime.utcnow().isoformat(timespec="seconds"), "base_url": base_url,
+                 "requests": requests, "concurrency": concurrency, "warmup": warmup,
+                 "git_revision": git_revision(), "python": platform.python_version()},
+        "scenarios": {},
+    }
+    for scenario in scenarios(base_url):
+        if only and scenario["name"] not in only:
+            continue
+        result = run_scenario(base_url, scenario, requests, concurrency, warmup)
+        report["scenarios"][scenario["name"]] = result
+        print(f"{scenario['name']:<38} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+              f"p99 {result['p99_ms']:>9.2f}ms  {result['throughput_rps']:>8.1f} req/s  errors {result['errors']}  "
+              f"throttled {result['throttled']}")
+    return report
+
+
+def compare(baseline: dict, current: dict, metric: str = "p95_ms", tolerance: float = 0.2) -> list[str]:
+    """Scenarios whose metric grew by more than tolerance (0.2 = 20%) over the baseline report."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        if result[metric] > before[metric] * (1 + tolerance):
+            regressions.append(f"{name}: {metric} {before[metric]} -> {result[metric]}")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {result['errors']}")
+        if result.get("throttled", 0) > before.get("throttled", 0):
+            regressions.append(f"{name}: throttled (429) {before.get('throttled', 0)} -> {result['throttled']}")
+    return regressions
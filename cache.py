@@ -0,0 +1,181 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from typing import Any, Callable
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.responses import Response
+
+
+# Process-local backend: a dict with per-key expiry. It is also the stand-in for the shared backend in
+# tests and local runs, since both expose the same get/set/delete/incr methods.
+class LocalCacheBackend:
+    def __init__(self, max_entries: int = 10000):
+        self.lock = threading.Lock()
+        self.entries: dict[str, tuple[Any, float | None]] = {}
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self._evict()
+            self.entries[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def _evict(self):
+        # Drop expired entries, then the oldest expiring ones; keys without expiry (counters) are kept.
+        now = time.monotonic()
+        self.entries = {key: entry for key, entry in self.entries.items() if entry[1] is None or entry[1] > now}
+        expiring = [key for key, entry in self.entries.items() if entry[1] is not None]
+        for key in expiring[:len(expiring) // 2 if len(self.entries) >= self.max_entries else 0]:
+            del self.entries[key]
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self.lock:
+            value, expires_at = self.entries.get(key, (0, None))
+            self.entries[key] = (value + 1, expires_at)
+            return value + 1
+
+
+# Shared backend so every uvicorn worker sees the same entries and the same invalidations.
+# Values are stored as JSON, so cached rows must be JSON-serializable (dates come back as strings).
+class RedisCacheBackend:
+    def __init__(self, url: str, prefix: str = "hospital:"):
+        import redis  # optional dependency, only needed when CACHE_URL points at redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        self.client.set(self.prefix + key, json.dumps(value, default=str), ex=int(ttl) if ttl else None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.prefix + key))
+
+
+def backend_from_url(url: str | None):
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisCacheBackend(url)
+    return LocalCacheBackend()
+
+
+# Read-through cache: a miss calls the loader once and stores the result for ttl seconds;
+# writers call invalidate() so the next read reloads.
+class TTLCache:
+    def __init__(self, backend, ttl: float, prefix: str = ""):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        value = self.backend.get(self.prefix + key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = loader()
+        self.backend.set(self.prefix + key, value, self.ttl)
+        return value
+
+    def invalidate(self, key: str):
+        self.backend.delete(self.prefix + key)
+
+
+# Change counters per table, bumped from the write hooks. The epoch is fresh whenever the backend starts
+# empty (a new process with the local backend, a flushed redis), so a version number is never reused
+# for different data.
+class TableVersions:
+    def __init__(self, backend, prefix: str = "table_version:"):
+        self.backend = backend
+        self.prefix = prefix
+        epoch = backend.get(prefix + "epoch")
+        if epoch is None:
+            backend.set(prefix + "epoch", uuid.uuid4().hex)
+            epoch = backend.get(prefix + "epoch")
+        self.epoch = epoch
+
+    def bump(self, table: str) -> int:
+        return self.backend.incr(self.prefix + table)
+
+    def get(self, tables) -> tuple:
+        return tuple(self.backend.get(self.prefix + table) or 0 for table in sorted(tables))
+
+
+# Whole-page cache for GET routes rendered from a fixed set of tables. A page is keyed by path, query
+# string, the app version (a deploy may render it differently) and the current versions of its tables,
+# and that key is also its ETag: a matching If-None-Match
+# gets a 304 and a cached body is replayed, both without running the route or touching the database.
+class PageCacheMiddleware:
+    def __init__(self, app, backend, versions: TableVersions, pages: dict[str, set[str]], ttl: float,
+                 app_version: str = ""):
+        self.app = app
+        self.app_version = app_version
+        self.backend = backend
+        self.versions = versions
+        self.pages = pages
+        self.ttl = ttl
+
+    async def __call__(self, scope, receive, send):
+        tables = self.pages.get(scope.get("path")) if scope["type"] == "http" and scope["method"] == "GET" else None
+        if tables is None:
+            await self.app(scope, receive, send)
+            return
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        key = f"{scope['path']}?{query}|{self.app_version}|{self.versions.epoch}|{self.versions.get(tables)}"
+        etag = '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+        headers = {"etag": etag, "cache-control": "no-cache"}
+        scope["page_cache"] = True
+        request_headers = dict(scope["headers"])
+        if etag in request_headers.get(b"if-none-match", b"").decode("latin-1"):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+        cached = self.backend.get("page:" + etag)
+        if cached is not None:
+            response = Response(cached["body"], headers={**headers, "content-type": cached["content_type"]})
+            await response(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+
+        async def send_caching(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                if message["status"] == 200:
+                    message["headers"] = list(message["headers"]) + [(name.encode(), value.encode())
+                                                                     for name, value in headers.items()]
+            elif message["type"] == "http.response.body" and start_message["status"] == 200:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    content_type = dict(start_message["headers"]).get(b"content-type", b"text/html").decode("latin-1")
+                    self.backend.set("page:" + etag, {"body": b"".join(chunks).decode("utf-8"),
+                                                      "content_type": content_type}, self.ttl)
+            await send(message)
+
+        await self.app(scope, receive, send_caching)
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("hospital")
+
+
+def seq_key(seq: str) -> tuple:
+    # local sequence numbers are "<epoch>-17", redis stream ids "1700000000000-3"; both order by their integer parts
+    return tuple(int(part) for part in seq.split("-"))
+
+
+def make_event(table: str, old: dict | None, new: dict | None) -> dict:
+    if old is None and new is None:
+        op = "reset"  # a bulk change: the rows are unknown, clients should reload
+    elif old is None:
+        op = "insert"
+    elif new is None:
+        op = "delete"
+    else:
+        op = "update"
+    return {"table": table, "op": op, "old": old, "new": new}
+
+
+class Subscription:
+    """One client's view of the feed: the events after its resume point that pass its filters, delivered
+    through a bounded asyncio queue on the client's event loop. A client that falls queue_size events
+    behind is cut off with an "overflow" message instead of buffering without limit; it reconnects with
+    the last seq it received and catches up from the feed's buffer.
+    """
+
+    def __init__(self, feed, loop: asyncio.AbstractEventLoop, filters: dict, queue_size: int):
+        self.feed = feed
+        self.loop = loop
+        self.filters = filters
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.last_seq: tuple = ()
+        self.closed = False
+
+    def matches(self, event: dict) -> bool:
+        if event["op"] == "reset":
+            return True
+        return any(row is not None and all(row.get(name) == value for name, value in self.filters.items())
+                   for row in (event["old"], event["new"]))
+
+    def offer(self, event: dict):
+        # runs on self.loop; the backlog and the live events may overlap, so skip what was already queued
+        if self.closed or seq_key(event["seq"]) <= self.last_seq or not self.matches(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+            self.last_seq = seq_key(event["seq"])
+        except asyncio.QueueFull:
+            self.close({"op": "overflow"})
+
+    def close(self, message: dict | None = None):
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float) -> dict | None:
+        # {"op": "keepalive"} when nothing arrived within timeout; after close() the closing message or None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return {"op": "keepalive"}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """Record writes as a stream of numbered events. publish() is a write hook and may run on any thread;
+    the last buffer_size events are kept so a client can resume from the seq it saw last.
+
+    Seqs carry a random per-process epoch: a seq handed out by another worker (or before a restart) is
+    never found in this buffer, so resuming from it gets a reset instead of the wrong events. The events
+    themselves are only this process's writes; several workers need RedisChangeFeed.
+    """
+
+    def __init__(self, buffer_size: int = 10000, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.events: deque = deque(maxlen=buffer_size)
+        self.subscribers: set[Subscription] = set()
+        self.epoch = secrets.randbits(48)
+        self.next_seq = 1
+        self.published = 0
+
+    def publish(self, table: str, old: dict | None, new: dict | None):
+        with self.lock:
+            event = {"seq": f"{self.epoch}-{self.next_seq}", **make_event(table, old, new)}
+            self.next_seq += 1
+            self._dispatch(event)
+
+    def _dispatch(self, event: dict):
+        # with self.lock held
+        self.events.append(event)
+        self.published += 1
+        for subscriber in self.subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                pass  # its loop has shut down; the subscription goes away with it
+
+    def backlog(self, after: str) -> list[dict] | None:
+        # events after seq `after`, or None when it is no longer (or not yet) in the buffer
+        with self.lock:
+            events = list(self.events)
+        position = next((i for i, event in enumerate(events) if event["seq"] == after), None)
+        return None if position is None else events[position + 1:]
+
+    def subscribe(self, filters: dict, after: str | None = None) -> Subscription:
+        subscription = Subscription(self, asyncio.get_running_loop(), filters, self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscription)
+        if after is not None:
+            # registered first, so nothing published meanwhile is lost; offer() drops the duplicates
+            events = self.backlog(after)
+            if events is None:
+                subscription.queue.put_nowait({"seq": after, "table": None, "op": "reset", "old": None, "new": None})
+            else:
+                subscription.last_seq = seq_key(after)
+                for event in events:
+                    subscription.offer(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+
+class RedisChangeFeed(ChangeFeed):
+    """The same feed shared by every uvicorn worker through a redis stream: publish() appends to the
+    stream (its ids are the seqs), the stream is the resume buffer, and one thread per worker reads new
+    entries and hands them to that worker's subscribers.
+    """
+
+    def __init__(self, url: str, stream: str = "hospital:changefeed", buffer_size: int = 10000, queue_size: int = 1000):
+        import redis  # optional dependency, only needed when CACHE_URL points at redis
+
+        super().__init__(buffer_size, queue_size)
+        self.client = redis.Redis.from_url(url)
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.reader: threading.Thread | None = None
+
+    def publish(self, table: str, old: dict | None, new: dict | None):
+        payload = json.dumps(make_event(table, old, new), default=str)
+        self.client.xadd(self.stream, {"event": payload}, maxlen=self.buffer_size, approximate=True)
+
+    def _event(self, entry_id, fields) -> dict:
+        return {"seq": entry_id.decode(), **json.loads(fields[b"event"])}
+
+    def backlog(self, after: str) -> list[dict] | None:
+        entries = self.client.xrange(self.stream, min=after, max="+", count=self.buffer_size + 1)
+        if not entries or entries[0][0].decode() != after:
+            return None
+        return [self._event(entry_id, fields) for entry_id, fields in entries[1:]]
+
+    def subscribe(self, filters: dict, after: str | None = None) -> Subscription:
+        with self.lock:
+            if self.reader is None:
+                # start right after the newest entry; anything older is in reach of backlog()
+                newest = self.client.xrevrange(self.stream, count=1)
+                self.reader = threading.Thread(target=self._read, args=(newest[0][0] if newest else "0-0",),
+                                               name="changefeed-reader", daemon=True)
+                self.reader.start()
+        return super().subscribe(filters, after)
+
+    def _read(self, last_id):
+        while True:
+            try:
+                for _, entries in self.client.xread({self.stream: last_id}, block=5000) or ():
+                    for entry_id, fields in entries:
+                        last_id = entry_id
+                        with self.lock:
+                            self._dispatch(self._event(entry_id, fields))
+            except Exception:
+                logger.exception("change feed: reading %s failed", self.stream)
+                time.sleep(1)
+
+
+def feed_from_url(url: str | None, buffer_size: int, queue_size: int) -> ChangeFeed:
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisChangeFeed(url, buffer_size=buffer_size, queue_size=queue_size)
+    return ChangeFeed(buffer_size, queue_size)
@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable
+
+logger = logging.getLogger("hospital.jobs")
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStopped(Exception):
+    pass
+
+
+# Local job queue in a SQLite file, shared by the uvicorn workers of one host. Every statement runs in
+# its own short transaction; claim() takes a job with a single conditional UPDATE, so two workers never
+# run the same one.
+class JobQueue:
+    columns = ("id", "kind", "params", "status", "done", "total", "cursor", "result", "error", "cancel_requested",
+               "created_at", "started_at", "finished_at", "heartbeat_at", "worker")
+
+    def __init__(self, path: str):
+        self.path = path
+        with self.connect() as conn:
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("create table if not exists jobs ("
+                         "id integer primary key autoincrement, "
+                         "kind text not null, "
+                         "params text not null, "
+                         "status text not null, "
+                         "done integer not null default 0, "
+                         "total integer, "
+                         "cursor text, "
+                         "result text, "
+                         "error text, "
+                         "cancel_requested integer not null default 0, "
+                         "created_at text not null, "
+                         "started_at text, "
+                         "finished_at text, "
+                         "heartbeat_at real, "
+                         "worker text)")
+            conn.execute("create index if not exists idx_jobs_status on jobs (status, id)")
+
+    @contextmanager
+    def connect(self):
+        # isolation_level=None: autocommit, with explicit BEGIN IMMEDIATE where a read must not race a write
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _job(self, row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(zip(self.columns, row))
+        for name in ("params", "cursor", "result"):
+            job[name] = None if job[name] is None else json.loads(job[name])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(self, kind: str, params: dict) -> dict:
+        with self.connect() as conn:
+            cursor = conn.execute("insert into jobs (kind, params, status, created_at) values (?, ?, ?, ?)",
+                                  (kind, json.dumps(params, default=str), QUEUED, datetime.utcnow().isoformat()))
+        return self.get(cursor.lastrowid)
+
+    def get(self, job_id: int) -> dict | None:
+        with self.connect() as conn:
+            return self._job(conn.execute(f"select {', '.join(self.columns)} from jobs where id = ?", (job_id,)).fetchone())
+
+    def list(self, status: str | None = None, limit: int = 50) -> list[dict]:
+        where, args = ("where status = ?", (status,)) if status else ("", ())
+        with self.connect() as conn:
+            rows = conn.execute(f"select {', '.join(self.columns)} from jobs {where} order by id desc limit ?",
+                                (*args, limit)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def cancel(self, job_id: int) -> dict | None:
+        # a queued job is cancelled at once; a running one stops at its next checkpoint
+        now = datetime.utcnow().isoformat()
+        with self.connect() as conn:
+            conn.execute("update jobs set status = ?, finished_at = ? where id = ? and status = ?",
+                         (CANCELLED, now, job_id, QUEUED))
+            conn.execute("update jobs set cancel_requested = 1 where id = ? and status = ?", (job_id, RUNNING))
+        return self.get(job_id)
+
+    def claim(self, worker: str) -> dict | None:
+        now = datetime.utcnow().isoformat()
+        with self.connect() as conn:
+            cursor = conn.execute("update jobs set status = ?, worker = ?, started_at = coalesce(started_at, ?), "
+                                  "heartbeat_at = ? where id = (select id from jobs where status = ? order by id limit 1) "
+                                  "and status = ?", (RUNNING, worker, now, time.time(), QUEUED, QUEUED))
+            if cursor.rowcount == 0:
+                return None
+            # a worker runs one job at a time, so this is the row just claimed
+            row = conn.execute(f"select {', '.join(self.columns)} from jobs where status = ? and worker = ?",
+                               (RUNNING, worker)).fetchone()
+        return self._job(row)
+
+    def checkpoint(self, job_id: int, done: int, total: int | None, cursor) -> bool:
+        # saves progress and returns whether a cancel was requested
+        with self.connect() as conn:
+            conn.execute("update jobs set done = ?, total = ?, cursor = ?, heartbeat_at = ? where id = ?",
+                         (done, total, json.dumps(cursor, default=str), time.time(), job_id))
+            return bool(conn.execute("select cancel_requested from jobs where id = ?", (job_id,)).fetchone()[0])
+
+    def finish(self, job_id: int, status: str, result: Any = None, error: str | None = None):
+        # a finished job has done all of its total, whatever its last checkpoint counted
+        with self.connect() as conn:
+            conn.execute("update jobs set status = ?, result = ?, error = ?, finished_at = ?, "
+                         "done = case when ? = ? then coalesce(total, done) else done end where id = ?",
+                         (status, json.dumps(result, default=str), error, datetime.utcnow().isoformat(), status, DONE,
+                          job_id))
+
+    def release(self, job_id: int, resumable: bool):
+        # the job's worker is shutting down between two chunks
+        with self.connect() as conn:
+            if resumable:
+                conn.execute("update jobs set status = ?, worker = null where id = ?", (QUEUED, job_id))
+            else:
+                conn.execute("update jobs set status = ?, error = ?, finished_at = ? where id = ?",
+                             (FAILED, "interrupted by a shutdown", datetime.utcnow().isoformat(), job_id))
+
+    def recover(self, stale_after: float, resumable: set[str]):
+        # Jobs whose worker stopped sending heartbeats died with their process. Resumable kinds go back to
+        # the queue and continue from their saved cursor; the others fail, with the cursor showing how far
+        # they got, because their last chunk may or may not have been committed.
+        cutoff = time.time() - stale_after
+        now = datetime.utcnow().isoformat()
+        with self.connect() as conn:
+            conn.execute("begin immediate")
+            for job_id, kind in conn.execute("select id, kind from jobs where status = ? and heartbeat_at < ?",
+                                             (RUNNING, cutoff)).fetchall():
+                if kind in resumable:
+                    conn.execute("update jobs set status = ?, worker = null where id = ?", (QUEUED, job_id))
+                else:
+                    conn.execute("update jobs set status = ?, error = ?, finished_at = ? where id = ?",
+                                 (FAILED, "interrupted: the worker running it stopped", now, job_id))
+            conn.execute("commit")
+
+
+class JobContext:
+    """Handed to a job handler: the job's params, the cursor it stopped at (when resumed), and checkpoint()
+    to report progress after each committed chunk. checkpoint() raises JobCancelled once a cancel has
+    been requested (JobStopped when the worker shuts down), and pauses between chunks so interactive
+    requests get the database in between."""
+
+    def __init__(self, queue: JobQueue, job: dict, pause: float, stopping: threading.Event):
+        self.queue = queue
+        self.job = job
+        self.stopping = stopping
+        self.params = job["params"]
+        self.cursor = job["cursor"]
+        self.done = job["done"]
+        self.total = job["total"]
+        self.pause = pause
+
+    def checkpoint(self, done: int, total: int | None, cursor):
+        self.done, self.total, self.cursor = done, total, cursor
+        if self.queue.checkpoint(self.job["id"], done, total, cursor):
+            raise JobCancelled()
+        if self.stopping.wait(self.pause):
+            raise JobStopped()
+
+
+class JobWorkers:
+    """Threads that take jobs from the queue and run the handler registered for their kind."""
+
+    def __init__(self, queue: JobQueue, handlers: dict[str, Callable[[JobContext], Any]], resumable: set[str],
+                 threads: int = 1, poll_interval: float = 1.0, pause: float = 0.05, stale_after: float = 60.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.resumable = resumable
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.pause = pause
+        self.stale_after = stale_after
+        self.stopping = threading.Event()
+        self.workers: list[threading.Thread] = []
+
+    def start(self):
+        self.queue.recover(self.stale_after, self.resumable)
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._run, args=(f"{os.getpid()}-{i}",), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.workers.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        # running jobs stop after their current chunk; one still busy after timeout is left RUNNING and
+        # handled by recover() on the next start
+        self.stopping.set()
+        for thread in self.workers:
+            thread.join(timeout)
+        self.workers = []
+
+    def _run(self, worker: str):
+        while not self.stopping.is_set():
+            try:
+                job = self.queue.claim(worker)
+            except sqlite3.Error:
+                logger.exception("claiming a job failed")
+                job = None
+            if job is None:
+                self.stopping.wait(self.poll_interval)
+                continue
+            self._execute(job)
+
+    def _execute(self, job: dict):
+        context = JobContext(self.queue, job, self.pause, self.stopping)
+        try:
+            result = self.handlers[job["kind"]](context)
+        except JobCancelled:
+            self.queue.finish(job["id"], CANCELLED, {"done": context.done})
+        except JobStopped:
+            self.queue.release(job["id"], job["kind"] in self.resumable)
+        except Exception as exc:
+            logger.exception("job %s (%s) failed", job["id"], job["kind"])
+            self.queue.finish(job["id"], FAILED, {"done": context.done}, f"{type(exc).__name__}: {exc}")
+        else:
+            self.queue.finish(job["id"], DONE, result)
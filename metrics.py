@@ -0,0 +1,220 @@
+import bisect
+import functools
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from sqlalchemy import event
+
+logger = logging.getLogger("hospital.sql")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Keeps label cardinality bounded: statements beyond this many distinct fingerprints share one series.
+MAX_FINGERPRINTS = 500
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{format_labels(self.labels, label_values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {series[-1]}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.series.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: list = []
+        # callables returning already formatted exposition lines (gauges read at scrape time)
+        self.collectors: list[Callable[[], list[str]]] = []
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collector in self.collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, help: str, samples: dict[tuple, float], labels: tuple = (), kind: str = "gauge") -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for label_values, value in samples.items():
+        lines.append(f"{name}{format_labels(labels, label_values)} {value}")
+    return lines
+
+
+registry = MetricsRegistry()
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status"))
+http_request_sql_seconds = registry.histogram(
+    "http_request_sql_seconds", "Time spent in SQL per request", ("method", "route"))
+http_request_sql_statements = registry.histogram(
+    "http_request_sql_statements", "SQL statements per request", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100))
+sql_statement_seconds = registry.histogram(
+    "sql_statement_duration_seconds", "SQL statement latency by fingerprint", ("fingerprint",))
+template_render_seconds = registry.histogram(
+    "template_render_duration_seconds", "Jinja template render time", ("template",))
+
+
+# Per-request accumulators, set by MetricsMiddleware and filled in by the engine listeners.
+class RequestTimings:
+    __slots__ = ("sql_count", "sql_seconds")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+
+current_request: ContextVar[RequestTimings | None] = ContextVar("current_request", default=None)
+
+_placeholder = r"(?:%s|\?|%\(\w+\)s|:\w+)"
+_placeholder_list = re.compile(r"\(\s*" + _placeholder + r"(?:\s*,\s*" + _placeholder + r")+\s*\)")
+_values_list = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_whitespace = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    # Same statement shape -> same series: literals become ?, IN lists and multi-row VALUES collapse.
+    statement = _whitespace.sub(" ", statement.strip())
+    statement = _literals.sub("?", statement)
+    statement = _placeholder_list.sub("(...)", statement)
+    return _values_list.sub(r"\1", statement)
+
+
+_labels: set[str] = set()
+_labels_lock = threading.Lock()
+
+
+def statement_label(statement: str) -> str:
+    label = fingerprint(statement)
+    if label not in _labels:
+        with _labels_lock:
+            if len(_labels) >= MAX_FINGERPRINTS:
+                return "other"
+            _labels.add(label)
+    return label
+
+
+def instrument_engine(engine, slow_query_seconds: float):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = current_request.get()
+        if timings is not None:
+            timings.sql_count += 1
+        # on the statement's execution context, not the connection: a statement that raises never reaches
+        # after_cursor_execute, and its start time goes away with its context
+        context.query_start_time = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_start_time
+        label = statement_label(statement)
+        sql_statement_seconds.observe(elapsed, label)
+        timings = current_request.get()
+        if timings is not None:
+            timings.sql_seconds += elapsed
+        if elapsed >= slow_query_seconds:
+            logger.warning("slow query %.3fs: %s", elapsed, label)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    def __init__(self, app, route_label: Callable[[dict], str]):
+        self.app = app
+        self.route_label = route_label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = current_request.set(timings)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_timed(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            current_request.reset(token)
+            route = self.route_label(scope)
+            method = scope["method"]
+            http_request_seconds.observe(time.perf_counter() - start, method, route, f"{status_code // 100}xx")
+            http_request_sql_seconds.observe(timings.sql_seconds, method, route)
+            http_request_sql_statements.observe(timings.sql_count, method, route)
@@ -0,0 +1,253 @@
+import importlib.util
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+from sqlalchemy import inspect, text
+
+VERSIONS_DIR = Path(__file__).parent / "versions"
+
+
+# A revision is a module in versions/ defining revision, down_revision, upgrade(conn) and downgrade(conn);
+# the chain is ordered by following down_revision from None, like Alembic.
+def load_revisions() -> list:
+    modules = {}
+    for path in sorted(VERSIONS_DIR.glob("*.py")):
+        spec = importlib.util.spec_from_file_location(f"migrations.versions.{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules[module.down_revision] = module
+    chain, previous = [], None
+    while previous in modules:
+        chain.append(modules.pop(previous))
+        previous = chain[-1].revision
+    if modules:
+        raise RuntimeError(f"Revisions not reachable from the base: {[m.revision for m in modules.values()]}")
+    return chain
+
+
+def ensure_version_table(conn):
+    conn.execute(text("create table if not exists schema_version ("
+                      "version varchar(32) not null primary key, applied_at datetime not null)"))
+
+
+def current_version(conn) -> str | None:
+    ensure_version_table(conn)
+    return conn.execute(text("select version from schema_version")).scalar()
+
+
+def set_version(conn, version: str | None):
+    conn.execute(text("delete from schema_version"))
+    if version is not None:
+        conn.execute(text("insert into schema_version values (:version, :applied_at)"),
+                     {"version": version, "applied_at": datetime.utcnow()})
+
+
+# MySQL commits DDL implicitly, so every revision runs in its own transaction and the version row
+# is written right after it: a failure leaves schema_version pointing at the last revision that finished.
+def upgrade(engine, target: str | None = None):
+    revisions = load_revisions()
+    with engine.begin() as conn:
+        current = current_version(conn)
+    names = [r.revision for r in revisions]
+    start = names.index(current) + 1 if current else 0
+    stop = names.index(target) + 1 if target else len(revisions)
+    for revision in revisions[start:stop]:
+        print(f"upgrade {revision.revision}: {revision.__doc__.strip().splitlines()[0]}")
+        with engine.begin() as conn:
+            revision.upgrade(conn)
+            set_version(conn, revision.revision)
+
+
+def downgrade(engine, target: str | None):
+    revisions = load_revisions()
+    with engine.begin() as conn:
+        current = current_version(conn)
+    if current is None:
+        return
+    names = [r.revision for r in revisions]
+    stop = names.index(target) + 1 if target else 0
+    for revision in reversed(revisions[stop:names.index(current) + 1]):
+        print(f"downgrade {revision.revision}")
+        with engine.begin() as conn:
+            revision.downgrade(conn)
+            set_version(conn, revision.down_revision)
+
+
+# Idempotent helpers so a revision can run against databases that already have some of its keys,
+# e.g. idx_pathogen created by hand for assignment query 8.
+def index_names(conn, table: str) -> set[str]:
+    return {index["name"] for index in inspect(conn).get_indexes(table)}
+
+
+def primary_key(conn, table: str) -> list[str]:
+    return inspect(conn).get_pk_constraint(table)["constrained_columns"]
+
+
+def create_index(conn, name: str, table: str, columns: list[str]):
+    if name not in index_names(conn, table):
+        conn.execute(text(f"create index {name} on {table} ({', '.join(columns)})"))
+
+
+def drop_index(conn, name: str, table: str):
+    if name in index_names(conn, table):
+        conn.execute(text(f"drop index {name} on {table}" if conn.dialect.name == "mysql" else f"drop index {name}"))
+
+
+def add_primary_key(conn, table: str, columns: list[str]):
+    if primary_key(conn, table):
+        return
+    column_list = ", ".join(columns)
+    duplicates = conn.execute(text(f"select count(*) from (select {column_list} from {table} "
+                                   f"group by {column_list} having count(*) > 1) d")).scalar()
+    if duplicates:
+        raise RuntimeError(f"{table} has {duplicates} duplicated ({column_list}) keys; "
+                           f"remove them before adding the primary key")
+    conn.execute(text(f"alter table {table} add primary key ({column_list})"))
+
+
+def drop_primary_key(conn, table: str):
+    if primary_key(conn, table):
+        conn.execute(text(f"alter table {table} drop primary key"))
+
+
+# Monthly RANGE partitions on a date column (MySQL). Rows before the first month land in p_old and rows past
+# the last one in pmax, so an insert never fails; add_month_partitions splits new months out of pmax ahead
+# of time, which is cheap while pmax is still empty.
+def add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def month_partition(month: date) -> str:
+    return f"partition p{month:%Y%m} values less than (to_days('{add_months(month, 1)}'))"
+
+
+def month_partitions(column: str, first: date, last: date) -> str:
+    months = []
+    month = add_months(first, 0)
+    while month <= last:
+        months.append(month_partition(month))
+        month = add_months(month, 1)
+    return (f"partition by range (to_days({column})) (partition p_old values less than (to_days('{add_months(first, 0)}')), "
+            + "".join(partition + ", " for partition in months) + "partition pmax values less than maxvalue)")
+
+
+def add_month_partitions(conn, table: str, until: date) -> list[str]:
+    names = conn.execute(text("select partition_name from information_schema.partitions "
+                              "where table_schema = database() and table_name = :table and partition_name like 'p2%'"),
+                         {"table": table}).scalars().all()
+    if not names:
+        return []
+    month, until = add_months(datetime.strptime(max(names), "p%Y%m").date(), 1), add_months(until, 0)
+    months = []
+    while month <= until:
+        months.append(month)
+        month = add_months(month, 1)
+    if months:
+        conn.execute(text(f"alter table {table} reorganize partition pmax into ("
+                          + "".join(month_partition(month) + ", " for month in months)
+                          + "partition pmax values less than maxvalue)"))
+    return [f"p{month:%Y%m}" for month in months]
+
+
+# Compares primary keys, named indexes and foreign keys of the ORM models with the live schema.
+def check(engine, metadata) -> list[str]:
+    problems = []
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        existing = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing:
+                problems.append(f"{table.name}: table is missing")
+                continue
+            model_pk = [column.name for column in table.primary_key.columns]
+            db_pk = inspector.get_pk_constraint(table.name)["constrained_columns"]
+            if sorted(model_pk) != sorted(db_pk):
+                problems.append(f"{table.name}: primary key is {db_pk} in the database, {model_pk} in the models")
+            db_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in db_indexes:
+                    problems.append(f"{table.name}: index {index.name} is missing")
+            # (columns, referred table, referred columns), constraint names differ between the DDL and the models
+            model_fks = {(tuple(fk.column_keys), fk.referred_table.name, tuple(element.column.name for element in fk.elements))
+                         for fk in table.foreign_key_constraints}
+            db_fks = {(tuple(fk["constrained_columns"]), fk["referred_table"], tuple(fk["referred_columns"]))
+                      for fk in inspector.get_foreign_keys(table.name)}
+            for columns, referred, referred_columns in sorted(model_fks - db_fks):
+                problems.append(f"{table.name}: foreign key {list(columns)} -> {referred}{list(referred_columns)} "
+                                f"is missing in the database")
+            for columns, referred, referred_columns in sorted(db_fks - model_fks):
+                problems.append(f"{table.name}: foreign key {list(columns)} -> {referred}{list(referred_columns)} "
+                                f"is not in the models")
+    return problems
+
+
+# The hot queries, with representative parameters. EXPLAIN must not show a full scan (type ALL) for any of them.
+EXPLAIN_QUERIES = {
+    "records by disease_code": ("select email, cname, disease_code, total_deaths, total_patients from record "
+                                "where disease_code = :code order by email, cname, disease_code limit 51",
+                                {"code": "covid-19"}),
+    "records by email": ("select * from record where email = :email", {"email": "someone@example.com"}),
+    "records page by country": ("select email, cname, disease_code, total_deaths, total_patients from record "
+                                "where cname = :cname and disease_code = :code "
+                                "order by email, cname, disease_code limit 51", {"cname": "Kazakhstan", "code": "covid-19"}),
+    "patients per country": ("select cname, sum(total_patients) from record group by cname", {}),
+    "users by country": ("select * from users where cname = :cname order by email limit 51", {"cname": "Kazakhstan"}),
+    "diseases by pathogen": ("select disease_code from disease where pathogen = :pathogen", {"pathogen": "bacteria"}),
+    "discoveries by disease": ("select * from discover where disease_code = :code", {"code": "covid-19"}),
+    "daily trend by country": ("select day, sum(total_patients) from case_daily where cname = :cname "
+                               "and day between :start and :end group by day", {"cname": "Kazakhstan",
+                                                                                  "start": "2022-01-01", "end": "2022-12-31"}),
+    "weekly trend by disease": ("select week, sum(total_patients) from case_weekly where disease_code = :code "
+                                "and week between :start and :end group by week", {"code": "covid-19",
+                                                                                   "start": "2020-01-01", "end": "2022-12-31"}),
+}
+
+
+def explain(engine) -> list[str]:
+    problems = []
+    with engine.connect() as conn:
+        for name, (sql, params) in EXPLAIN_QUERIES.items():
+            for row in conn.execute(text("explain " + sql), params).mappings():
+                access = row.get("type")
+                print(f"{name}: table={row.get('table')} type={access} key={row.get('key')} rows={row.get('rows')}")
+                if access == "ALL":
+                    problems.append(f"{name}: full scan of {row.get('table')}")
+    return problems
+
+
+def main(argv: list[str]):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("current")
+    commands.add_parser("upgrade").add_argument("target", nargs="?")
+    commands.add_parser("downgrade").add_argument("target", nargs="?")
+    commands.add_parser("check")
+    commands.add_parser("explain")
+    partitions = commands.add_parser("partitions", help="add the case_report partitions for the coming months")
+    partitions.add_argument("--months", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    import main as app_module
+
+    engine = app_module.sqlalchemy_engine
+    if args.command == "current":
+        with engine.begin() as conn:
+            print(current_version(conn) or "base")
+    elif args.command == "upgrade":
+        upgrade(engine, args.target)
+    elif args.command == "downgrade":
+        downgrade(engine, args.target)
+    elif args.command == "partitions":
+        if engine.dialect.name == "mysql":
+            with engine.begin() as conn:
+                added = add_month_partitions(conn, "case_report", add_months(date.today(), args.months))
+            print(f"added {', '.join(added)}" if added else "case_report partitions are up to date")
+    else:
+        problems = check(engine, app_module.Base.metadata) if args.command == "check" else explain(engine)
+        for problem in problems:
+            print(problem)
+        sys.exit(1 if problems else 0)
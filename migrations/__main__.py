@@ -0,0 +1,5 @@
+import sys
+
+from migrations import main
+
+main(sys.argv[1:])
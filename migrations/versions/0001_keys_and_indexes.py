@@ -0,0 +1,50 @@
+"""Primary keys and secondary indexes for the hot record/users columns
+
+AssignmentSQL.sql creates discover, publicservant, doctor, specialize and record without primary keys
+and has no index behind the record/users filters. Composite keys make the keyset pages range scans,
+and the record indexes cover the per-country/per-disease filters and aggregates.
+"""
+from migrations import add_primary_key, create_index, drop_index, drop_primary_key
+
+revision = "0001"
+down_revision = None
+
+PRIMARY_KEYS = {
+    "discover": ["cname", "disease_code"],
+    "publicservant": ["email"],
+    "doctor": ["email"],
+    "specialize": ["id", "email"],
+    "record": ["email", "cname", "disease_code"],
+}
+INDEXES = [
+    ("idx_record_disease_code", "record", ["disease_code"]),
+    ("idx_record_cname_disease", "record", ["cname", "disease_code", "total_patients", "total_deaths"]),
+    ("idx_users_cname", "users", ["cname"]),
+    ("idx_pathogen", "disease", ["pathogen"]),
+]
+# InnoDB drops the implicit index behind a foreign key once a key above can serve it, and refuses to drop
+# that key again while the foreign key needs it, so the downgrade puts plain indexes back first.
+FOREIGN_KEY_COLUMNS = [
+    ("discover", "cname"),
+    ("publicservant", "email"),
+    ("doctor", "email"),
+    ("specialize", "id"),
+    ("record", "email"),
+    ("record", "disease_code"),
+]
+
+
+def upgrade(conn):
+    for table, columns in PRIMARY_KEYS.items():
+        add_primary_key(conn, table, columns)
+    for name, table, columns in INDEXES:
+        create_index(conn, name, table, columns)
+
+
+def downgrade(conn):
+    for table, column in FOREIGN_KEY_COLUMNS:
+        create_index(conn, f"fk_{table}_{column}", table, [column])
+    for name, table, _ in reversed(INDEXES):
+        drop_index(conn, name, table)
+    for table in reversed(list(PRIMARY_KEYS)):
+        drop_primary_key(conn, table)
@@ -0,0 +1,30 @@
+"""Per-country/per-disease case counters
+
+case_counter holds the running record totals for each (cname, disease_code); the application keeps it in
+step with record on every write. The upgrade backfills it from record in the same transaction.
+"""
+from sqlalchemy import text
+
+from migrations import create_index
+
+revision = "0002"
+down_revision = "0001"
+
+
+def upgrade(conn):
+    conn.execute(text("create table if not exists case_counter ("
+                      "cname varchar(50) not null, "
+                      "disease_code varchar(50) not null, "
+                      "records integer not null default 0, "
+                      "total_patients bigint not null default 0, "
+                      "total_deaths bigint not null default 0, "
+                      "primary key (cname, disease_code))"))
+    create_index(conn, "idx_case_counter_disease", "case_counter", ["disease_code"])
+    conn.execute(text("delete from case_counter"))
+    conn.execute(text("insert into case_counter (cname, disease_code, records, total_patients, total_deaths) "
+                      "select cname, disease_code, count(*), coalesce(sum(total_patients), 0), "
+                      "coalesce(sum(total_deaths), 0) from record group by cname, disease_code"))
+
+
+def downgrade(conn):
+    conn.execute(text("drop table if exists case_counter"))
@@ -0,0 +1,51 @@
+"""Daily case reports, partitioned by month, with daily and weekly rollups
+
+case_report keeps one row per (email, cname, disease_code, report_date) instead of record's single snapshot.
+On MySQL it is range-partitioned by month of report_date, so date-bounded scans and dropping old months
+touch only their partitions; partitioned InnoDB tables cannot have foreign keys, so it has none.
+case_daily and case_weekly are the running sums per country, disease and day/week that the trend routes
+read. The tables are new, so there is nothing to backfill. `python -m migrations partitions` adds months
+ahead of time (run it monthly, e.g. from cron).
+"""
+from datetime import date
+
+from sqlalchemy import text
+
+from migrations import add_months, create_index, month_partitions
+
+revision = "0003"
+down_revision = "0002"
+
+FIRST_MONTH = date(2020, 1, 1)
+MONTHS_AHEAD = 12
+
+
+def upgrade(conn):
+    partitions = ""
+    if conn.dialect.name == "mysql":
+        partitions = " " + month_partitions("report_date", FIRST_MONTH, add_months(date.today(), MONTHS_AHEAD))
+    conn.execute(text("create table if not exists case_report ("
+                      "email varchar(60) not null, "
+                      "cname varchar(50) not null, "
+                      "disease_code varchar(50) not null, "
+                      "report_date date not null, "
+                      "total_deaths integer not null, "
+                      "total_patients integer not null, "
+                      "primary key (email, cname, disease_code, report_date))" + partitions))
+    create_index(conn, "idx_case_report_date", "case_report", ["report_date", "cname", "disease_code"])
+    for table, column in (("case_daily", "day"), ("case_weekly", "week")):
+        conn.execute(text(f"create table if not exists {table} ("
+                          f"cname varchar(50) not null, "
+                          f"disease_code varchar(50) not null, "
+                          f"{column} date not null, "
+                          f"reports integer not null default 0, "
+                          f"total_patients bigint not null default 0, "
+                          f"total_deaths bigint not null default 0, "
+                          f"primary key (cname, disease_code, {column}))"))
+        create_index(conn, f"idx_{table}_disease", table, ["disease_code", column])
+        create_index(conn, f"idx_{table}_{column}", table, [column])
+
+
+def downgrade(conn):
+    for table in ("case_weekly", "case_daily", "case_report"):
+        conn.execute(text(f"drop table if exists {table}"))
@@ -0,0 +1,161 @@
+import asyncio
+import math
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Callable
+
+from starlette.responses import JSONResponse
+
+WRITE, READ, LIST = "write", "read", "list"
+
+
+def parse_limit(value: str) -> tuple[float, float] | None:
+    # "rate:burst" in requests per second, e.g. "20:40"; "0" or "" turns the limit off
+    rate, _, burst = value.partition(":")
+    if not rate or float(rate) <= 0:
+        return None
+    return float(rate), float(burst or rate)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        # 0 when a token was taken, otherwise the seconds until the next one
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    """Rate limits and a concurrency cap for one worker's event loop.
+
+    Each (client, route class) pair has its own token bucket; the least recently seen buckets beyond
+    max_clients are dropped. At most max_in_flight requests run at once (0: no cap). Writes that find
+    every slot taken wait up to write_wait seconds and get the next slot that frees up; reads are shed
+    when the slots are taken or writes are waiting, and list pages already once list_share of the slots
+    are busy, so a wave of dashboard refreshes cannot starve the writes.
+
+    Everything here runs on the event loop thread, so there is no locking.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, float] | None], max_in_flight: int, list_share: float = 0.5,
+                 write_wait: float = 1.0, max_clients: int = 10000):
+        self.limits = limits
+        self.max_in_flight = max_in_flight
+        self.list_slots = max(1, int(max_in_flight * list_share))
+        self.write_wait = write_wait
+        self.max_clients = max_clients
+        self.buckets: OrderedDict[tuple, TokenBucket] = OrderedDict()
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        # (route class, "admitted" | "rate_limited" | "shed") -> requests
+        self.counts: Counter = Counter()
+
+    def rate_check(self, client: str, route_class: str) -> float:
+        # 0 when the client may go ahead, otherwise the seconds it should wait
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return 0.0
+        now = time.monotonic()
+        key = (client, route_class)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(*limit, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.take(now)
+
+    async def acquire(self, route_class: str) -> bool:
+        if not self.max_in_flight:
+            self.in_flight += 1
+            return True
+        slots = self.list_slots if route_class == LIST else self.max_in_flight
+        if self.in_flight < slots and not self.waiters:
+            self.in_flight += 1
+            return True
+        if route_class != WRITE or self.write_wait <= 0:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        admitted = False
+        try:
+            # release() hands its slot straight to the first waiter, in_flight already counts it
+            admitted = await asyncio.wait_for(waiter, self.write_wait)
+            return admitted
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # a timed out or cancelled waiter must not keep shedding reads from the queue
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            elif not admitted and waiter.done() and not waiter.cancelled():
+                self.release()  # handed a slot just as the request was cancelled
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+
+def client_address(header: str | None = None) -> Callable[[dict], str]:
+    # The client a request is charged to: the first address of `header` (e.g. X-Forwarded-For, behind a
+    # proxy that sets it), else the peer address.
+    name = header.lower().encode("latin-1") if header else None
+
+    def address(scope: dict) -> str:
+        if name is not None:
+            for key, value in scope["headers"]:
+                if key == name:
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+    return address
+
+
+# Answers over-limit requests before they reach routing or take a database connection: 429 when the
+# client is over its rate, 503 when the worker is at its concurrency cap, both with Retry-After.
+class AdmissionMiddleware:
+    def __init__(self, app, control: AdmissionControl, classify: Callable[[dict], str | None],
+                 client: Callable[[dict], str]):
+        self.app = app
+        self.control = control
+        self.classify = classify
+        self.client = client
+
+    async def __call__(self, scope, receive, send):
+        route_class = self.classify(scope) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        control = self.control
+        retry_after = control.rate_check(self.client(scope), route_class)
+        if retry_after:
+            control.counts[route_class, "rate_limited"] += 1
+            await JSONResponse({"detail": "Too many requests"}, status_code=429,
+                               headers={"retry-after": str(math.ceil(retry_after))})(scope, receive, send)
+            return
+        if not await control.acquire(route_class):
+            control.counts[route_class, "shed"] += 1
+            await JSONResponse({"detail": "Server busy, retry shortly"}, status_code=503,
+                               headers={"retry-after": "1"})(scope, receive, send)
+            return
+        control.counts[route_class, "admitted"] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            control.release()
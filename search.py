@@ -0,0 +1,184 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from array import array
+from collections import defaultdict
+
+_non_alnum = re.compile(r"[^0-9a-z]+")
+
+# Ranks, best first.
+EXACT, WORD_PREFIX, SUBSTRING = 0, 1, 2
+
+
+def normalize(value) -> str:
+    # lower case, every run of punctuation/space becomes one space: "Ali.Bek@world.com" -> "ali bek world com"
+    return _non_alnum.sub(" ", str(value or "").lower()).strip()
+
+
+def word_trigrams(text: str) -> set[str]:
+    # pg_trgm style: each word padded with two leading and one trailing space, so "  b" and " be" mark
+    # words starting with "be" and a one or two letter query can still use the index
+    trigrams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def query_trigrams(query: str, prefix: bool) -> set[str]:
+    # prefix: the first word of the query must start a word; otherwise it may sit anywhere inside one
+    words = query.split()
+    trigrams = set()
+    for position, word in enumerate(words):
+        padded = word
+        if position > 0 or prefix:
+            padded = "  " + padded
+        if position < len(words) - 1:
+            padded += " "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    if not trigrams and words:
+        # a one or two letter substring matches almost everything; treat it as a word prefix
+        return query_trigrams(query, prefix=True)
+    return trigrams
+
+
+class TrigramIndex:
+    """In-process trigram index over a few text columns of one table, ranked and paginated.
+
+    Documents are numbered in key order by build(), so the postings (sorted arrays of document ids) are in
+    key order too. Writes append new ids to small per-trigram delta lists and tombstone the old ones; once
+    the deltas grow past compact_threshold the arrays are rebuilt from the documents kept in memory, without
+    going back to the database. Exact matches are looked up in a dict from normalized field text to ids.
+    """
+
+    def __init__(self, key: str, fields: tuple[str, ...], compact_threshold: int = 50_000):
+        self.key = key
+        self.fields = fields
+        self.compact_threshold = compact_threshold
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self.rows: list[dict | None] = []
+        self.texts: list[tuple[str, ...] | None] = []
+        self.ids: dict = {}
+        # normalized field text -> ids of the live documents with a field equal to it
+        self.exact: defaultdict = defaultdict(set)
+        self.postings: dict[str, array] = {}
+        self.delta: defaultdict = defaultdict(list)
+        self.delta_size = 0
+
+    def build(self, rows):
+        # rows must come in key order
+        with self.lock:
+            self.clear()
+            lists = defaultdict(list)
+            for row in rows:
+                doc_id = self._add_document(row)
+                for trigram in self._document_trigrams(doc_id):
+                    lists[trigram].append(doc_id)
+            self.postings = {trigram: array("I", ids) for trigram, ids in lists.items()}
+
+    def upsert(self, row: dict):
+        with self.lock:
+            self._remove(row[self.key])
+            doc_id = self._add_document(row)
+            for trigram in self._document_trigrams(doc_id):
+                self.delta[trigram].append(doc_id)
+            self.delta_size += 1
+            if self.delta_size > self.compact_threshold:
+                self.build(sorted((row for row in self.rows if row is not None), key=lambda row: row[self.key]))
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _add_document(self, row: dict) -> int:
+        doc_id = len(self.rows)
+        self.rows.append({name: row[name] for name in (self.key, *self.fields)})
+        self.texts.append(tuple(normalize(row[name]) for name in self.fields))
+        self.ids[row[self.key]] = doc_id
+        for text in self.texts[doc_id]:
+            self.exact[text].add(doc_id)
+        return doc_id
+
+    def _document_trigrams(self, doc_id: int) -> set[str]:
+        return word_trigrams(" ".join(self.texts[doc_id]))
+
+    def _remove(self, key):
+        doc_id = self.ids.pop(key, None)
+        if doc_id is not None:
+            for text in self.texts[doc_id]:
+                self.exact[text].discard(doc_id)
+                if not self.exact[text]:
+                    del self.exact[text]
+            self.rows[doc_id] = None
+            self.texts[doc_id] = None
+
+    def _posting_size(self, trigram: str) -> int:
+        return len(self.postings.get(trigram, ())) + len(self.delta.get(trigram, ()))
+
+    def _contains(self, trigram: str, doc_id: int) -> bool:
+        for ids in (self.postings.get(trigram, ()), self.delta.get(trigram, ())):
+            position = bisect.bisect_left(ids, doc_id)
+            if position < len(ids) and ids[position] == doc_id:
+                return True
+        return False
+
+    def _candidates(self, trigrams: set[str], delta: bool):
+        # Walks the shortest posting list in id order and probes the others with binary search. The built
+        # arrays (delta=False) hold only ids below the first delta id, so this yields them in key order.
+        if any(self._posting_size(trigram) == 0 for trigram in trigrams):
+            return
+        shortest, *others = sorted(trigrams, key=self._posting_size)
+        for doc_id in (self.delta if delta else self.postings).get(shortest, ()):
+            if self.texts[doc_id] is not None and all(self._contains(trigram, doc_id) for trigram in others):
+                yield doc_id
+
+    def rank(self, doc_id: int, query: str) -> int | None:
+        best = None
+        for text in self.texts[doc_id]:
+            if text == query:
+                return EXACT
+            if (" " + query) in (" " + text):
+                best = WORD_PREFIX
+            elif query in text and best is None:
+                best = SUBSTRING
+        return best
+
+    def _matches(self, query: str, trigrams: set[str], rank: int):
+        # documents of exactly this rank in key order: the built ids are in key order already, the few
+        # delta ids are sorted and merged in
+        def ranked(doc_ids):
+            return (doc_id for doc_id in doc_ids if self.rank(doc_id, query) == rank)
+
+        key = self.key
+        delta = sorted(ranked(self._candidates(trigrams, delta=True)), key=lambda doc_id: self.rows[doc_id][key])
+        return heapq.merge(ranked(self._candidates(trigrams, delta=False)), delta,
+                           key=lambda doc_id: self.rows[doc_id][key])
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> tuple[list[dict], bool]:
+        """Rows matching query as a substring of any field, exact matches first, then word-prefix matches,
+        then the rest, each group in key order. Returns the page and whether there are more.
+
+        The three groups are read lazily and in order, so a page costs about offset + limit matches and
+        every page of the same query sees the same ordering, however deep.
+        """
+        query = normalize(query)
+        if not query:
+            return [], False
+        with self.lock:
+            exact = heapq.nsmallest(offset + limit + 1, self.exact.get(query, ()),
+                                    key=lambda doc_id: self.rows[doc_id][self.key])
+            matches = itertools.chain(
+                ((EXACT, doc_id) for doc_id in exact),
+                ((WORD_PREFIX, doc_id) for doc_id in self._matches(query, query_trigrams(query, prefix=True), WORD_PREFIX)),
+                ((SUBSTRING, doc_id) for doc_id in self._matches(query, query_trigrams(query, prefix=False), SUBSTRING)))
+            page = [{**self.rows[doc_id], "rank": rank}
+                    for rank, doc_id in itertools.islice(matches, offset, offset + limit + 1)]
+            return page[:limit], len(page) > limit
@@ -0,0 +1,41 @@
+"""Production entry point: one uvicorn worker per core on uvloop and httptools.
+
+    WEB_CONCURRENCY=4 CACHE_URL=redis://redis:6379/0 PORT=80 python serve.py
+
+More than one worker needs CACHE_URL pointing at redis: the /records/events change feed, the page cache
+versions and the reference cache are otherwise per process, and a client would only see the writes
+handled by whichever worker it happened to connect to.
+
+On SIGTERM every worker stops accepting connections, lets its in-flight requests finish (bounded by
+the container's stop_grace_period) and then runs the shutdown hook in main.py, which disposes the engines.
+"""
+import os
+
+import uvicorn
+
+# main.py imports its sibling modules (metrics, cache, ...) at top level, so this runs from the code directory
+APP = "main:app"
+
+
+def main():
+    workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    if workers > 1 and not os.getenv("CACHE_URL", "").startswith(("redis://", "rediss://")):
+        raise SystemExit(f"WEB_CONCURRENCY={workers} needs CACHE_URL=redis://... to share the change feed and "
+                         f"caches between workers (or set WEB_CONCURRENCY=1)")
+    uvicorn.run(
+        APP,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "80")),
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_TIMEOUT", "5")),
+        lifespan="on",
+        access_log=os.getenv("ACCESS_LOG", "0").strip().lower() in ("1", "true", "yes", "on"),
+    )
+
+
+if __name__ == "__main__":
+    main()
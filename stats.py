@@ -0,0 +1,289 @@
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+
+
+class Dictionary:
+    """Dictionary encoding for a string column: each distinct value gets a small integer code, so a column
+    is an integer array and grouping by it is a bincount."""
+
+    def __init__(self):
+        self.values: list = []
+        self.codes: dict = {}
+
+    def encode(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class RecordColumns:
+    """record as parallel NumPy arrays, one slot per (email, cname, disease_code) key.
+
+    Writes patch the arrays in place: an update overwrites its slot, an insert takes the next free slot
+    (the arrays grow by doubling), a delete clears its slot's `live` flag and zeroes its counts. Every
+    aggregate masks on `live`, so a dead slot costs a little memory until the next load and nothing else.
+
+    `totals` is (records, deaths, patients) per country and disease, kept in step with the slots, so the
+    per-country and per-disease aggregates only touch a countries x diseases cube.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.emails = Dictionary()
+        self.countries = Dictionary()
+        self.diseases = Dictionary()
+        self.pathogens = Dictionary()
+        self.slots: dict[tuple, int] = {}
+        self.size = 0
+        self.email = np.zeros(capacity, np.int32)
+        self.cname = np.zeros(capacity, np.int32)
+        self.disease = np.zeros(capacity, np.int32)
+        self.deaths = np.zeros(capacity, np.int64)
+        self.patients = np.zeros(capacity, np.int64)
+        self.live = np.zeros(capacity, bool)
+        # indexed by country / disease code
+        self.population = np.zeros(0, np.int64)
+        self.pathogen = np.zeros(0, np.int32)
+        self.totals = np.zeros((3, 0, 0), np.int64)
+
+    def _reserve(self, size: int):
+        capacity = len(self.live)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ("email", "cname", "disease", "deaths", "patients", "live"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def _grow_lookups(self):
+        # codes handed out since the last write need a population / pathogen slot (0 and -1 mean unknown)
+        if len(self.population) < len(self.countries):
+            self.population = np.concatenate([self.population, np.zeros(len(self.countries) - len(self.population), np.int64)])
+        if len(self.pathogen) < len(self.diseases):
+            self.pathogen = np.concatenate([self.pathogen, np.full(len(self.diseases) - len(self.pathogen), -1, np.int32)])
+        if self.totals.shape[1:] != (len(self.countries), len(self.diseases)):
+            totals = np.zeros((3, len(self.countries), len(self.diseases)), np.int64)
+            totals[:, :self.totals.shape[1], :self.totals.shape[2]] = self.totals
+            self.totals = totals
+
+    def _add_totals(self, slots, sign: int):
+        where = (self.cname[slots], self.disease[slots])
+        np.add.at(self.totals[0], where, sign)
+        np.add.at(self.totals[1], where, sign * self.deaths[slots])
+        np.add.at(self.totals[2], where, sign * self.patients[slots])
+
+    def append_rows(self, rows: list[tuple]):
+        # rows of (email, cname, disease_code, total_deaths, total_patients) with keys not seen yet
+        start = self.size
+        self._reserve(start + len(rows))
+        end = start + len(rows)
+        encode_email, encode_cname, encode_disease = self.emails.encode, self.countries.encode, self.diseases.encode
+        self.email[start:end] = [encode_email(row[0]) for row in rows]
+        self.cname[start:end] = [encode_cname(row[1]) for row in rows]
+        self.disease[start:end] = [encode_disease(row[2]) for row in rows]
+        self.deaths[start:end] = [row[3] or 0 for row in rows]
+        self.patients[start:end] = [row[4] or 0 for row in rows]
+        self.live[start:end] = True
+        self.slots.update(((row[0], row[1], row[2]), slot) for slot, row in enumerate(rows, start))
+        self.size = end
+        self._grow_lookups()
+        self._add_totals(slice(start, end), 1)
+
+    def upsert(self, row: dict):
+        key = (row["email"], row["cname"], row["disease_code"])
+        slot = self.slots.get(key)
+        if slot is None:
+            self.append_rows([(*key, row["total_deaths"], row["total_patients"])])
+            return
+        self._add_totals([slot], -1)
+        self.deaths[slot] = row["total_deaths"] or 0
+        self.patients[slot] = row["total_patients"] or 0
+        self._add_totals([slot], 1)
+
+    def remove(self, row: dict):
+        slot = self.slots.pop((row["email"], row["cname"], row["disease_code"]), None)
+        if slot is not None:
+            self._add_totals([slot], -1)
+            self.live[slot] = False
+            self.deaths[slot] = self.patients[slot] = 0
+
+    def set_country(self, cname: str, population: int | None):
+        code = self.countries.encode(cname)
+        self._grow_lookups()
+        self.population[code] = population or 0
+
+    def set_disease(self, disease_code: str, pathogen: str | None):
+        code = self.diseases.encode(disease_code)
+        self._grow_lookups()
+        self.pathogen[code] = -1 if pathogen is None else self.pathogens.encode(pathogen)
+
+    def mask(self, cname: str | None = None, disease_code: str | None = None) -> np.ndarray:
+        # live slots, optionally only one country / disease; an unknown value matches nothing
+        mask = self.live[:self.size].copy()
+        for value, dictionary, column in ((cname, self.countries, self.cname), (disease_code, self.diseases, self.disease)):
+            if value is not None:
+                code = dictionary.codes.get(value)
+                mask &= False if code is None else column[:self.size] == code
+        return mask
+
+    def totals_by(self, axis: str, cname: str | None = None, disease_code: str | None = None) -> np.ndarray:
+        # (records, deaths, patients) x disease (axis "disease") or x country (axis "cname"), optionally
+        # only for one country / disease
+        totals = self.totals
+        for value, dictionary, dimension in ((cname, self.countries, 1), (disease_code, self.diseases, 2)):
+            if value is not None:
+                code = dictionary.codes.get(value)
+                totals = totals.take([] if code is None else [code], axis=dimension)
+        return totals.sum(axis=1 if axis == "disease" else 2)
+
+
+class RecordStats:
+    """Vectorized epidemiology aggregates over a RecordColumns snapshot. The snapshot is loaded once per
+    worker, patched by on_write, and reloaded after max_age seconds to pick up other workers' writes.
+
+    A load builds new columns without holding self.lock, so on_write never waits for the database;
+    writes that arrive meanwhile are queued and replayed onto the new columns before they are swapped in
+    (upsert and remove set a slot's values, so replaying a write the load already saw changes nothing).
+
+    loader(db) returns (batches of record tuples, country rows, disease rows) for a load.
+    """
+
+    def __init__(self, loader: Callable, max_age: float):
+        self.loader = loader
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # one load at a time; readers and writers only take self.lock
+        self.load_lock = threading.Lock()
+        self.columns = RecordColumns()
+        self.loaded_at: float | None = None
+        # writes seen while a load is running, None when none is
+        self.pending: list[tuple] | None = None
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at <= self.max_age
+
+    def ensure_loaded(self, db) -> RecordColumns:
+        with self.lock:
+            if self._fresh():
+                return self.columns
+        with self.load_lock:
+            with self.lock:
+                if self._fresh():
+                    return self.columns
+                self.pending = []
+            try:
+                columns = self._load(*self.loader(db))
+            except BaseException:
+                with self.lock:
+                    self.pending = None
+                raise
+            with self.lock:
+                complete = all(self._apply(columns, *write) for write in self.pending)
+                self.pending = None
+                self.columns = columns
+                self.loaded_at = time.monotonic() if complete else None
+                return columns
+
+    @staticmethod
+    def _load(record_batches, countries: list[dict], diseases: list[dict]) -> RecordColumns:
+        columns = RecordColumns()
+        for country in countries:
+            columns.set_country(country["cname"], country["population"])
+        for disease in diseases:
+            columns.set_disease(disease["disease_code"], disease["pathogen"])
+        for batch in record_batches:
+            columns.append_rows(batch)
+        return columns
+
+    @staticmethod
+    def _apply(columns: RecordColumns, table: str, old: dict | None, new: dict | None) -> bool:
+        # patches columns with one write; False when it cannot be applied and a reload is needed
+        if not (old or new):
+            return table not in ("record", "country", "disease")
+        if table == "record":
+            if old and (not new or (old["email"], old["cname"], old["disease_code"])
+                        != (new["email"], new["cname"], new["disease_code"])):
+                columns.remove(old)
+            if new:
+                columns.upsert(new)
+        elif table == "country" and new:
+            columns.set_country(new["cname"], new.get("population"))
+        elif table == "disease" and new:
+            columns.set_disease(new["disease_code"], new.get("pathogen"))
+        return True
+
+    def on_write(self, table: str, old: dict | None, new: dict | None):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((table, old, new))
+            if self.loaded_at is not None and not self._apply(self.columns, table, old, new):
+                self.loaded_at = None
+
+    def case_fatality(self, db, by: str, cname: str | None = None) -> list[dict]:
+        # deaths / patients per disease or per pathogen
+        columns = self.ensure_loaded(db)
+        with self.lock:
+            return self._case_fatality(columns, by, cname)
+
+    @staticmethod
+    def _case_fatality(columns: RecordColumns, by: str, cname: str | None) -> list[dict]:
+        totals = columns.totals_by("disease", cname=cname)
+        if by == "pathogen":
+            names = columns.pathogens.values
+            known = columns.pathogen >= 0
+            totals = np.stack([np.bincount(columns.pathogen[known], weights=row[known], minlength=len(names))
+                               for row in totals])
+        else:
+            names = columns.diseases.values
+        records, deaths, patients = totals
+        rate = np.divide(deaths, patients, out=np.zeros(len(names)), where=patients > 0)
+        present = np.flatnonzero(records)
+        return [{by: names[i], "records": int(records[i]), "total_deaths": int(deaths[i]),
+                 "total_patients": int(patients[i]), "case_fatality_rate": float(rate[i])} for i in present]
+
+    def incidence(self, db, disease_code: str | None = None, per: int = 100_000) -> list[dict]:
+        # patients per `per` inhabitants, per country with a known population, highest first
+        columns = self.ensure_loaded(db)
+        with self.lock:
+            return self._incidence(columns, disease_code, per)
+
+    @staticmethod
+    def _incidence(columns: RecordColumns, disease_code: str | None, per: int) -> list[dict]:
+        groups = len(columns.countries)
+        records, deaths, patients = columns.totals_by("cname", disease_code=disease_code)
+        population = columns.population[:groups]
+        rate = np.divide(patients * per, population, out=np.zeros(groups), where=population > 0)
+        order = np.lexsort((np.arange(groups), -rate))
+        return [{"cname": columns.countries.values[i], "population": int(population[i]),
+                 "total_patients": int(patients[i]), "total_deaths": int(deaths[i]), "per": per,
+                 "incidence": float(rate[i])}
+                for i in order if records[i] and population[i] > 0]
+
+    def reporter_percentiles(self, db, percentiles: list[float], cname: str | None = None,
+                             disease_code: str | None = None) -> dict:
+        # distribution of the patients each public servant reported, summed over their matching records
+        columns = self.ensure_loaded(db)
+        with self.lock:
+            return self._reporter_percentiles(columns, percentiles, cname, disease_code)
+
+    @staticmethod
+    def _reporter_percentiles(columns: RecordColumns, percentiles: list[float], cname: str | None,
+                              disease_code: str | None) -> dict:
+        mask = columns.mask(cname, disease_code)
+        groups = len(columns.emails)
+        reporters = np.bincount(columns.email[:columns.size][mask], minlength=groups) > 0
+        patients = np.bincount(columns.email[:columns.size][mask], weights=columns.patients[:columns.size][mask],
+                               minlength=groups)[reporters]
+        values = np.percentile(patients, percentiles).tolist() if len(patients) else [None] * len(percentiles)
+        return {"reporters": int(reporters.sum()),
+                "percentiles": {f"{percentile:g}": value for percentile, value in zip(percentiles, values)}}